@@ -1,3 +1,4 @@
+import queue
 import socket, threading
 import time
 
@@ -15,6 +16,7 @@ def main():
     BROADCAST_IP = "255.255.255.255"
     PORT = 37020
     TCP_PORT = 5002
+    TCP_WORKERS = 8
 
     def handle_connection(conn, addr):
         print(f"TCP connection accepted: {addr}")
@@ -27,24 +29,40 @@ def main():
         print(msg)
         conn.close()
 
+    def tcp_worker(pending):
+        # Long-lived worker: handles accepted connections one after another
+        while True:
+            conn, addr = pending.get()
+            try:
+                handle_connection(conn, addr)
+            except Exception as e:
+                print(f"Connection error: {e}")
+            finally:
+                conn.close()
+
     def tcp_server():
         tcp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         tcp.bind(("0.0.0.0", TCP_PORT))
         tcp.listen()
         print(f"Listening to port: {TCP_PORT}")
 
+        pending = queue.Queue()
+        for _ in range(TCP_WORKERS):
+            threading.Thread(target=tcp_worker, args=(pending,), daemon=True).start()
+
         while True:
             conn, addr = tcp.accept()
-
-            handle_connection(conn, addr)
+            pending.put((conn, addr))
 
     def udp_server():
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        # The beacon never changes, so build it and its destination once
+        message = f"Hello|Port={TCP_PORT}".encode()
+        dest = (BROADCAST_IP, PORT)
 
         while True:
-            message = f"Hello|Port=5002".encode()
-            sock.sendto(message, (BROADCAST_IP, PORT))
+            sock.sendto(message, dest)
             print("Broadcast is sent")
             time.sleep(2)
 
@@ -1,4 +1,11 @@
+import codecs
+import functools
+import queue
+import sched
+import selectors
 import socket
+import struct
+import sys
 import threading
 import time
 
@@ -7,9 +14,24 @@ def main():
     UDP_PORT = 6002
     BROADCAST_IP = "255.255.255.255"
     TCP_LIST_PORT = 5002
-    UDP_MESSAGE = f"Sending Message|Port={TCP_LIST_PORT}".encode()
+    SOCK_BUF_SIZE = 4 * 1024 * 1024
+    RECV_BUF_SIZE = 64 * 1024
+    CHAT_FRAME_SIZE = 1400
+    CHAT_FLUSH_DELAY = 0.02
+    BEACON_INTERVAL = 10
+    PEER_PROMPT_TTL = 60
+    PEER_TABLE_LIMIT = 1024
+    # Beacon wire format: 4-byte magic + big-endian TCP port (6 bytes total)
+    BEACON = struct.Struct("!4sH")
+    BEACON_MAGIC = b"SWRM"
+    UDP_MESSAGE = BEACON.pack(BEACON_MAGIC, TCP_LIST_PORT)
     broadcast_event = threading.Event()
     broadcast_event.set()
+    # Lines typed by the user; None once stdin is closed
+    stdin_lines = queue.Queue()
+    # One byte per queued line, so a selector can wait on stdin as a socket
+    stdin_wake, stdin_wake_w = socket.socketpair()
+    stdin_wake_w.setblocking(False)
 
     def get_ip():
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -18,100 +40,290 @@ def main():
         s.close()
         return ip
 
+    def quick_ack(sock):
+        # Linux clears TCP_QUICKACK again by itself, so re-arm it after every read
+        if hasattr(socket, "TCP_QUICKACK"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
 
+    def take_lines(decoder, tail, data, final=False):
+        # TCP has no message boundaries: hold the unterminated rest in tail ([str])
+        *lines, rest = (tail[0] + decoder.decode(data, final)).split("\n")
+        tail[0] = ""
+        if final or len(rest) >= RECV_BUF_SIZE:
+            # Flush a trailing partial line at EOF, or once it outgrows one buffer
+            if rest:
+                lines.append(rest)
+        else:
+            tail[0] = rest
+        return [line.rstrip("\r") for line in lines]
+
+    def grow_buffers(sock):
+        # UDP only: a fixed SO_RCVBUF/SO_SNDBUF on a TCP socket turns off autotuning
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCK_BUF_SIZE)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCK_BUF_SIZE)
 
     def recieve_tcp_conn():
         tcp_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         tcp_sock.bind(("0.0.0.0", TCP_LIST_PORT))
         tcp_sock.listen()
+        tcp_sock.setblocking(False)
         print(f"TCP Server Listening on {TCP_LIST_PORT}")
 
-        def handle_client(conn, addr):
-            print(f"New connection from {addr}")
-            while True:
-                try:
-                    data = conn.recv(1024)
-                    if not data:
-                        break
-                    print(f"TCP Recieved from {addr}: {data.decode()}")
-                except Exception as e:
-                    print(f"Connection error: {e}")
-                    break
+        # One thread multiplexes the listener and every client socket
+        sel = selectors.DefaultSelector()
+        # Safe to share between clients: only the selector thread reads into it
+        recv_view = memoryview(bytearray(RECV_BUF_SIZE))
+
+        def close_client(conn, addr):
+            sel.unregister(conn)
             conn.close()
             print(f"Connection closed for {addr}")
 
-        while True:
+        def read_client(addr, decoder, tail, conn):
+            try:
+                n = conn.recv_into(recv_view)
+                if not n:
+                    for line in take_lines(decoder, tail, b"", final=True):
+                        print(f"TCP Recieved from {addr}: {line}")
+                    close_client(conn, addr)
+                    return
+                quick_ack(conn)
+                # Per-connection decoder: a character split across reads stays whole
+                for line in take_lines(decoder, tail, recv_view[:n]):
+                    print(f"TCP Recieved from {addr}: {line}")
+            except BlockingIOError:
+                pass
+            except Exception as e:
+                print(f"Connection error: {e}")
+                close_client(conn, addr)
+
+        def accept_client(sock):
             try:
-                conn, addr = tcp_sock.accept()
-                threading.Thread(target=handle_client, args=(conn, addr), daemon=True).start()
+                conn, addr = sock.accept()
+            except BlockingIOError:
+                return
             except Exception as e:
                 print(f"Accept error: {e}")
+                return
+            print(f"New connection from {addr}")
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            quick_ack(conn)
+            conn.setblocking(False)
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            sel.register(
+                conn,
+                selectors.EVENT_READ,
+                functools.partial(read_client, addr, decoder, [""]),
+            )
+
+        sel.register(tcp_sock, selectors.EVENT_READ, accept_client)
+        while True:
+            for key, _ in sel.select():
+                key.data(key.fileobj)
 
     threading.Thread(target=recieve_tcp_conn, daemon=True).start()
 
+    def read_stdin():
+        # Sole reader of sys.stdin; the connect prompt and the chat take lines from here
+        for line in sys.stdin:
+            stdin_lines.put(line.rstrip("\r\n"))
+            try:
+                stdin_wake_w.send(b"\0")
+            except BlockingIOError:
+                pass  # Wake-ups already pending; the chat loop drains the whole queue
+        stdin_lines.put(None)
+        try:
+            stdin_wake_w.send(b"\0")
+        except BlockingIOError:
+            pass
+
+    threading.Thread(target=read_stdin, daemon=True).start()
+
     def send_tcp_message(ip, port):
         # Client logic: persistent chat
+        print(f"Connecting to {ip}:{port}...")
+        # Stop broadcasting while chatting
+        broadcast_event.clear()
+
+        client_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # Watch typed lines and the peer together so a hang-up is noticed at once
+        chat_sel = selectors.DefaultSelector()
         try:
-            print(f"Connecting to {ip}:{port}...")
-            # Stop broadcasting while chatting
-            broadcast_event.clear()
-            
-            client_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            # Lines are batched in pending below; stop Nagle adding its own delay on top
+            client_sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             client_sock.connect((ip, port))
+            quick_ack(client_sock)
             print(f"Connected! Type 'exit' to stop.")
-            
-            while True:
-                msg = input(f"Me -> {ip} > ")
-                if msg.lower() == 'exit':
-                    break
-                client_sock.sendall(msg.encode())
-                
-            client_sock.close()
-            # Resume broadcasting after chat ends
-            broadcast_event.set()
+
+            chat_sel.register(stdin_wake, selectors.EVENT_READ)
+            chat_sel.register(client_sock, selectors.EVENT_READ)
+
+            pending = bytearray()
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            tail = [""]
+            chatting = True
+            print(f"Me -> {ip} > ", end="", flush=True)
+            while chatting:
+                # While a batch is waiting, a quiet CHAT_FLUSH_DELAY means stdin is idle
+                events = chat_sel.select(CHAT_FLUSH_DELAY if pending else None)
+                if not events:
+                    client_sock.sendall(pending)
+                    pending.clear()
+                    continue
+
+                for key, _ in events:
+                    if key.fileobj is client_sock:
+                        try:
+                            data = client_sock.recv(4096)
+                        except ConnectionResetError:
+                            data = b""
+                        if not data:
+                            for line in take_lines(decoder, tail, b"", final=True):
+                                print(f"\nTCP Recieved from {ip}: {line}")
+                            print(f"\n{ip} closed the connection.")
+                            chatting = False
+                            break
+                        quick_ack(client_sock)
+                        for line in take_lines(decoder, tail, data):
+                            print(f"\nTCP Recieved from {ip}: {line}")
+                        continue
+
+                    stdin_wake.recv(4096)
+                    typed = False
+                    while chatting:
+                        try:
+                            msg = stdin_lines.get_nowait()
+                        except queue.Empty:
+                            break
+                        typed = True
+                        if msg is None:
+                            # Leave the EOF marker for the connect prompt as well
+                            stdin_lines.put(None)
+                            chatting = False
+                        elif msg.lower() == "exit":
+                            chatting = False
+                        else:
+                            pending += msg.encode() + b"\n"
+                    if len(pending) >= CHAT_FRAME_SIZE:
+                        client_sock.sendall(pending)
+                        pending.clear()
+                    if chatting and typed:
+                        print(f"Me -> {ip} > ", end="", flush=True)
+
+            if pending:
+                client_sock.sendall(pending)
             print("Chat ended.")
         except Exception as e:
             print(f"Connection ended or failed: {e}")
+        finally:
+            chat_sel.close()
+            client_sock.close()
+            # Resume broadcasting after chat ends
+            broadcast_event.set()
+
+    def mark_prompted(seen, peer):
+        # Re-insert so dict order stays oldest prompt first; evict from the front
+        seen.pop(peer, None)
+        seen[peer] = time.monotonic()
+        if len(seen) > PEER_TABLE_LIMIT:
+            del seen[next(iter(seen))]
+
+    def prompt_peers(pending, seen, active_peers, stopped):
+        # Consumer side: the receive loop never waits on the user
+        while True:
+            addr, tcp_port = pending.get()
+            peer = (addr[0], tcp_port)
+            print(f"Recieved beacon from addr {addr} for TCP port {tcp_port}")
+
+            print(f"Do you want to connect to {addr}: (y/n)", end="", flush=True)
+            ans = stdin_lines.get()
+            if ans is None:
+                print("\nstdin closed; no longer prompting for peers.")
+                stopped.set()
+                return
+            mark_prompted(seen, peer)
+
+            if ans.lower() == "y":
+                print(f"You will be connecting to addr: {addr} and port: {tcp_port}")
+                send_tcp_message(addr[0], tcp_port)
+                # Count the TTL from the end of the chat, not from the answer
+                mark_prompted(seen, peer)
+            active_peers.discard(peer)
 
-    
     def udp_listen_server():
-       udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-       udp_sock.bind(("0.0.0.0",UDP_PORT))
-       
-       host_ip = get_ip()
-       print(f"Listening on port: {UDP_PORT} (My IP: {host_ip})")
-
-       while True:
-            data,addr = udp_sock.recvfrom(4096)
-            
+        udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        grow_buffers(udp_sock)
+        udp_sock.bind(("0.0.0.0", UDP_PORT))
+
+        host_ip = get_ip()
+        print(f"Listening on port: {UDP_PORT} (My IP: {host_ip})")
+
+        pending = queue.Queue()
+        # (ip, tcp_port) -> when the user was last prompted; written by prompt_peers
+        seen = {}
+        # Peers queued, being prompted, or in a chat; never queued a second time
+        active_peers = set()
+        # Set by prompt_peers when it exits; nothing reads pending after that
+        stopped = threading.Event()
+        threading.Thread(
+            target=prompt_peers,
+            args=(pending, seen, active_peers, stopped),
+            daemon=True,
+        ).start()
+
+        while not stopped.is_set():
+            data, addr = udp_sock.recvfrom(4096)
+
             if addr[0] == host_ip:
                 continue
-                
-            print(f"Recieved data from addr {addr} and data is {data.decode()}")
-            tcp_port = int(data.decode().split("Port=")[1])
 
-            ans = str(input(f"Do you want to connect to {addr}: (y/n)")).lower()
+            if len(data) < BEACON.size:
+                continue
+            magic, tcp_port = BEACON.unpack_from(data)
+            if magic != BEACON_MAGIC:
+                continue
+
+            # Peers re-beacon every BEACON_INTERVAL; only prompt again after the TTL
+            peer = (addr[0], tcp_port)
+            if peer in active_peers:
+                continue
+            last = seen.get(peer)
+            if last is not None and time.monotonic() - last < PEER_PROMPT_TTL:
+                continue
+            # The port comes from the payload, so one host could fill the queue
+            if len(active_peers) >= PEER_TABLE_LIMIT or stopped.is_set():
+                continue
+
+            active_peers.add(peer)
+            pending.put((addr, tcp_port))
+        udp_sock.close()
 
-            if ans == "y":
-                print(f"You will be connecting to addr: {addr} and port: {tcp_port}")
-                send_tcp_message(addr[0], tcp_port)
-                
     threading.Thread(target=udp_listen_server, daemon=True).start()
 
-    def udp_send_server(message):
+    def udp_send_server(periodic, message):
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        ip = get_ip()
-
-        
+        grow_buffers(sock)
+        # Fixed destination: connect once so each beat skips the sockaddr/route lookup
+        sock.connect((BROADCAST_IP, UDP_PORT))
+        send = sock.send
 
-        while True:
+        def beat():
             if broadcast_event.is_set():
-                sock.sendto(message,(BROADCAST_IP,UDP_PORT))
+                try:
+                    send(message)
+                except OSError as e:
+                    # A connected UDP socket reports queued ICMP errors on the next send
+                    print(f"Broadcast error: {e}")
                 # print(f"Broadcast is being done on {UDP_PORT}") # Commented out to keep UI clean
-            time.sleep(10)
+            periodic.enter(BEACON_INTERVAL, 1, beat)
+
+        periodic.enter(0, 1, beat)
 
-    udp_send_server(UDP_MESSAGE)
+    # Runs the beacon on the main thread
+    periodic = sched.scheduler(time.monotonic, time.sleep)
+    udp_send_server(periodic, UDP_MESSAGE)
+    periodic.run()
             
                 
 